@@ -1,12 +1,37 @@
 # ==============================================================================
 #                           Imports
 # ==============================================================================
+# Patch sockets, ssl and threading for gevent before anything else imports them,
+# so blocking GroupMe calls yield to other webhooks under a gevent worker.
+from gevent import monkey
+monkey.patch_all()
+
+import hmac      # For checking the /invalidate token in constant time
+import io        # For handing a pre-read request body back to Flask
 import os
+import random    # For jittering the rate-limit backoff
+import re        # For detecting the @all command
+import time      # For members cache expiry
+from itertools import accumulate # For computing mention offsets
+from array import array # Compact storage for per-page mention lengths
+import threading # For guarding the members cache
+from dataclasses import dataclass, field, replace # For the config and members cache entries
 import requests  # For making HTTP requests to the GroupMe API
+from requests.adapters import HTTPAdapter # For connection pooling
+from urllib3.util.retry import Retry       # For retrying transient API failures
+from urllib3.exceptions import HTTPError as Urllib3HTTPError # Raised by reads from response.raw
 import json      # For handling JSON data
+import orjson    # Fast JSON encoding for log output and outbound payloads
+try:
+    import ijson # Streams member objects out of the group response as they arrive
+except ImportError:
+    ijson = None # Fall back to parsing the whole response with response.json()
 import logging   # For better logging
 from flask import Flask, request, Response # Flask for the web server framework
-import traceback # For detailed exception logging
+from flask.json.provider import DefaultJSONProvider # For parsing request bodies with orjson
+from concurrent.futures import ThreadPoolExecutor # For sending mentions off the request thread
+from collections import OrderedDict # For remembering recently queued messages
+from functools import lru_cache # For memoizing the constant part of bot payloads
 
 # ==============================================================================
 #                           Logging Setup
@@ -17,85 +42,486 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
 )
+# Messages are passed as lazy '%s' arguments so they're only formatted when
+# the record is actually emitted.
+logger = logging.getLogger(__name__)
 
 # ==============================================================================
 #                           Flask App Initialization
 # ==============================================================================
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that parses request bodies with orjson, so
+    request.get_json() on the webhook doesn't go through the stdlib json module.
+    """
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # Initialize the Flask application
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # ==============================================================================
 #                           Configuration (Environment Variables)
 # ==============================================================================
-# Load configuration from environment variables.
-# These MUST be set in your Azure App Service configuration.
-BOT_ID = os.environ.get('GROUPME_BOT_ID')
-GROUP_ID = os.environ.get('GROUPME_GROUP_ID')
-ACCESS_TOKEN = os.environ.get('GROUPME_ACCESS_TOKEN') # Needed to fetch group members
+# Load configuration from environment variables, once at import.
+# These MUST be set in your Azure App Service configuration; App Service
+# restarts the app when they change, which is how new settings are picked up.
+@dataclass(frozen=True)
+class Config:
+    """
+    Bot settings parsed from the environment when the app starts. Frozen so
+    the loaded Config can be shared across threads without locking.
+    """
+    bot_id: str | None
+    group_id: str | None
+    token: str | None          # Needed to fetch group members
+    blacklist_str: str         # Raw comma-separated GroupMe User IDs, as configured
+    blacklist: frozenset       # Parsed blacklist User IDs
+    members_ttl: int           # Seconds a fetched member list is reused before hitting the API again
+    members_stale_ttl: int     # Further seconds an expired list may be used while it's refreshed in the background
+    mention_workers: int       # How many @all mentions can be fetched/sent concurrently in the background
+    mentions_per_message: int  # Most mentions put in a single bot post before starting another
+    warm_up: bool              # Fetch the members once at startup to prime the cache and connection pool
+    invalidate_token: str | None # Shared secret required by POST /invalidate; unset disables the route
+
+def load_config():
+    """
+    Reads the bot configuration from the environment.
 
-# New: Blacklist configuration
-# Expects a comma-separated string of GroupMe User IDs
-BLACKLISTED_USER_IDS_STR = os.environ.get('GROUPME_BLACKLIST_USER_IDS', '') # Default to empty string
-BLACKLISTED_USER_IDS = set(BLACKLISTED_USER_IDS_STR.split(',')) if BLACKLISTED_USER_IDS_STR else set()
+    Returns:
+        Config: The parsed configuration.
+    """
+    # Blacklist configuration: expects a comma-separated string of GroupMe User IDs
+    blacklist_str = os.environ.get('GROUPME_BLACKLIST_USER_IDS', '') # Default to empty string
+    return Config(
+        bot_id=os.environ.get('GROUPME_BOT_ID'),
+        group_id=os.environ.get('GROUPME_GROUP_ID'),
+        token=os.environ.get('GROUPME_ACCESS_TOKEN'),
+        blacklist_str=blacklist_str,
+        # Strip whitespace so "id1, id2" matches the same users as "id1,id2".
+        blacklist=frozenset(uid.strip() for uid in blacklist_str.split(',') if uid.strip()),
+        members_ttl=int(os.environ.get('GROUPME_MEMBERS_TTL', '120')), # Default to 2 minutes
+        # Off by default: a stale list can miss members who joined since it was fetched.
+        members_stale_ttl=int(os.environ.get('GROUPME_MEMBERS_STALE_TTL', '0')),
+        mention_workers=int(os.environ.get('GROUPME_MENTION_WORKERS', '4')),
+        mentions_per_message=max(1, int(os.environ.get('GROUPME_MENTIONS_PER_MESSAGE', '50'))),
+        warm_up=os.environ.get('GROUPME_WARM_UP', '1') != '0', # Set to 0 to disable
+        invalidate_token=os.environ.get('GROUPME_INVALIDATE_TOKEN') or None,
+    )
+
+CFG = load_config()
+
+# GroupMe rejects bot posts over 1000 characters, so large groups are split
+# across several messages (at most CFG.mentions_per_message mentions each).
+# The tag budget leaves room for the intro line.
+MAX_MENTION_TEXT_CHARS = 900
 
 # GroupMe API Base URL
 GROUPME_API_URL = 'https://api.groupme.com/v3'
 
+# (connect, read) timeouts in seconds for GroupMe API calls. A short connect
+# timeout fails fast on an unreachable API instead of tying up a worker.
+API_TIMEOUT = (3.05, 10)
+
+# Matches '@all' as its own word, so addresses like 'me@all.com' and names like
+# '@allison' don't trigger it, while '(@all)' or '@all,' still do. Matching
+# case-insensitively avoids lowercasing a copy of every message.
+_ALL_RE = re.compile(r'(?<!\w)@all(?!\w)', re.IGNORECASE)
+
 # --- Configuration Validation & Logging ---
-if not BOT_ID:
-    logging.warning("Environment variable GROUPME_BOT_ID is not set.")
-if not GROUP_ID:
-    logging.warning("Environment variable GROUPME_GROUP_ID is not set.")
-if not ACCESS_TOKEN:
-    logging.warning("Environment variable GROUPME_ACCESS_TOKEN is not set. Member fetching will fail.")
-if BLACKLISTED_USER_IDS:
-    logging.info(f"Blacklisted User IDs loaded: {BLACKLISTED_USER_IDS}")
+if not CFG.bot_id:
+    logger.warning("Environment variable GROUPME_BOT_ID is not set.")
+if not CFG.group_id:
+    logger.warning("Environment variable GROUPME_GROUP_ID is not set.")
+if not CFG.token:
+    logger.warning("Environment variable GROUPME_ACCESS_TOKEN is not set. Member fetching will fail.")
+logger.info(
+    "Members cache TTL: %ss (+%ss stale while refreshing). Background mention workers: %s.",
+    CFG.members_ttl, CFG.members_stale_ttl, CFG.mention_workers
+)
+if CFG.blacklist:
+    logger.info("Blacklisted User IDs loaded: %s", set(CFG.blacklist))
 else:
-    logging.info("No blacklisted User IDs configured or found.")
+    logger.info("No blacklisted User IDs configured or found.")
+
+# ==============================================================================
+#                           HTTP Session
+# ==============================================================================
+# A single shared session keeps connections to the GroupMe API alive between
+# calls, so only the first request pays for the TCP+TLS handshake.
+# Retries only apply to idempotent methods (GET), so a bot post is never sent twice,
+# and they wait out any Retry-After header GroupMe sends with a 429.
+# Every call goes to api.groupme.com, so a few host pools are plenty; the pool
+# for that host is sized so every background thread (EXECUTOR and SEND_EXECUTOR)
+# can hold a kept-alive connection instead of opening a throwaway one.
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=max(16, 2 * CFG.mention_workers),
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.2,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False # Hand the final response back so the usual error logging runs
+    )
+))
+
+# ==============================================================================
+#                           Rate Limiting
+# ==============================================================================
+# When GroupMe answers 429, no @all is processed until this time.monotonic()
+# deadline passes, so a burst of @all messages doesn't keep hammering the API.
+_throttled_until = 0.0
+
+# Full tracebacks are logged at most this often (in seconds), so an error storm
+# (e.g. GroupMe returning 5xx for every call) doesn't spend every request
+# formatting stack traces; the errors in between are logged on one line.
+TRACEBACK_LOG_INTERVAL = 1.0
+_last_traceback_at = 0.0
+
+# ==============================================================================
+#                           Background Executor
+# ==============================================================================
+# @all mentions are built and sent here rather than inside the webhook request.
+# A thread pool is enough for the handful of concurrent @all messages a group
+# sends; if the bot ever needs durable retries or to run across several
+# instances, swap this for a task queue such as Celery with the same
+# _process_all_mention() body as the task.
+# The pool, not an async client, is what lets GroupMe round trips overlap:
+# under a WSGI server an async Flask view still holds the worker until it
+# finishes, whereas a pool thread frees it as soon as the job is queued.
+EXECUTOR = ThreadPoolExecutor(max_workers=CFG.mention_workers, thread_name_prefix='mention')
+
+# When an @all is split across several messages they are posted in parallel.
+# This is a separate pool so an EXECUTOR job never waits on its own pool.
+SEND_EXECUTOR = ThreadPoolExecutor(max_workers=CFG.mention_workers, thread_name_prefix='send')
+
+# GroupMe can deliver the same message more than once (e.g. if it retries a
+# webhook), so remember the IDs of recently queued @all messages and skip repeats.
+# This is best-effort: the IDs are kept per process, so with several gunicorn
+# workers a redelivery that lands on a different worker is still posted.
+# Catching those would need shared storage such as Redis.
+_RECENT_MESSAGE_IDS = OrderedDict()
+_RECENT_MESSAGE_IDS_MAX = 256
+_RECENT_MESSAGE_IDS_LOCK = threading.Lock()
+
+# ==============================================================================
+#                           Members Cache
+# ==============================================================================
+# Closely-spaced @all messages would otherwise each make the same GET request
+# before the bot can reply. Entries are immutable and replaced whole, so a
+# fresh entry can be read without taking the lock; the lock only keeps
+# concurrent requests from all refreshing it at once.
+@dataclass(frozen=True)
+class MembersCacheEntry:
+    """
+    One fetched member list and everything derived from it.
+    """
+    fetched_at: float          # time.monotonic() of the last successful fetch or revalidation
+    members: list              # (tag, tag_u16_len, user_id) tuples, see get_group_members()
+    pages: list                # Mention pages precomputed from members, see _build_mention_pages()
+    etag: str | None           # ETag of the last response, sent back as If-None-Match
+    fingerprint: int           # Hash of the member tuples, to spot unchanged lists
+    # Serialized mention attachments per intro length, filled in by _mention_attachments().
+    # Shared with the entries replace() derives from this one, which have the same pages.
+    attachments_by_intro_len: dict = field(default_factory=dict, compare=False, repr=False)
+
+_members_cache = None # The current MembersCacheEntry, or None until the first fetch
+_MEMBERS_CACHE_LOCK = threading.Lock()
+
+# Returned by fetch_group_members() when GroupMe answers 304 Not Modified.
+NOT_MODIFIED = object()
+
+# Errors raised when the members response body isn't valid JSON.
+_MEMBERS_JSON_ERRORS = (json.JSONDecodeError, ijson.JSONError) if ijson else (json.JSONDecodeError,)
 
 # ==============================================================================
 #                           Helper Functions
 # ==============================================================================
 
-def get_group_members():
+def _dumps(obj):
+    """
+    Serializes obj to a JSON string with orjson, which is much faster than the
+    stdlib json module for the payloads logged and sent on every request.
+    """
+    return orjson.dumps(obj).decode()
+
+@lru_cache(maxsize=1)
+def _payload_prefix(bot_id):
+    """
+    Returns the serialized start of every bot post for bot_id, up to and
+    including the "text" key, so only the text and attachments are encoded per post.
+    """
+    return b'{"bot_id":' + orjson.dumps(bot_id) + b',"text":'
+
+def _u16len(s):
+    """
+    Returns the length of s in UTF-16 code units, the unit GroupMe uses for
+    mention loci. Emoji and other non-BMP characters count as two.
+    """
+    return len(s.encode('utf-16-le')) >> 1
+
+def _start_throttle(response):
+    """
+    Records a GroupMe 429 response, pausing @all processing until its
+    Retry-After has passed (plus up to a second of jitter so instances don't
+    all resume at once).
+
+    Args:
+        response (requests.Response): The 429 response.
+    """
+    global _throttled_until
+    retry_after = response.headers.get('Retry-After', '5')
+    try:
+        delay = max(float(retry_after), 0.0)
+    except ValueError:
+        delay = 5.0 # Retry-After given as an HTTP date; fall back to the default
+    _throttled_until = time.monotonic() + delay + random.uniform(0, 1)
+    logger.warning("GroupMe rate limit hit. Pausing @all processing for %.0fs.", delay)
+
+def _log_exception(message, exc):
+    """
+    Logs an unexpected exception from inside an except block, with its traceback
+    at most once every TRACEBACK_LOG_INTERVAL seconds and as a one-line error otherwise.
+
+    Args:
+        message (str): What failed.
+        exc (Exception): The exception being handled.
+    """
+    global _last_traceback_at
+    now = time.monotonic()
+    if now - _last_traceback_at >= TRACEBACK_LOG_INTERVAL:
+        _last_traceback_at = now
+        logger.exception(message)
+    else:
+        logger.error("%s: %r (traceback suppressed)", message, exc)
+
+def _submit_background(description, fn, *args):
+    """
+    Queues fn(*args) on EXECUTOR for a job nobody waits on, logging any exception
+    it raises, since otherwise it would only be stored on the unread future.
+
+    Args:
+        description (str): What the job does, for the error log.
+        fn (callable): The function to run.
+        *args: Arguments passed to fn.
+
+    Returns:
+        concurrent.futures.Future: The future of the queued job.
+    """
+    def run():
+        try:
+            return fn(*args)
+        except Exception as e:
+            _log_exception(f"Background {description} failed", e)
+    return EXECUTOR.submit(run)
+
+def _already_queued(message_id):
+    """
+    Records message_id as queued and reports whether this worker already queued it.
+
+    Args:
+        message_id (str): The GroupMe message ID, or None if the webhook had none.
+
+    Returns:
+        bool: True if this message was already queued recently, False otherwise.
+    """
+    if not message_id:
+        return False
+    with _RECENT_MESSAGE_IDS_LOCK:
+        if message_id in _RECENT_MESSAGE_IDS:
+            return True
+        _RECENT_MESSAGE_IDS[message_id] = None
+        if len(_RECENT_MESSAGE_IDS) > _RECENT_MESSAGE_IDS_MAX:
+            _RECENT_MESSAGE_IDS.popitem(last=False)
+    return False
+
+def cache_bust():
+    """
+    Discards the cached member list so the next lookup refetches it from the API.
+    """
+    global _members_cache
+    with _MEMBERS_CACHE_LOCK:
+        _members_cache = None
+    logger.info("Group members cache invalidated.")
+
+def get_group_members(no_cache=False):
+    """
+    Returns all members of the specified GroupMe group, using the cached list
+    if it was fetched within the last CFG.members_ttl seconds.
+
+    Args:
+        no_cache (bool, optional): Skip the cache and always fetch from the API.
+
+    Returns:
+        list: A list of (tag, tag_u16_len, user_id) tuples, one per member, where
+              tag is '@' + nickname and tag_u16_len its length in UTF-16 code
+              units; or None if an error occurs.
+    """
+    entry = get_members_entry(no_cache)
+    return entry.members if entry is not None else None
+
+def get_members_entry(no_cache=False):
     """
-    Fetches all members of the specified GroupMe group.
+    Returns the members cache entry, holding the group members together with
+    their precomputed mention pages, so the pages always match the members.
+
+    Args:
+        no_cache (bool, optional): Skip the cache and always fetch from the API.
+
+    Returns:
+        MembersCacheEntry: The current entry, or None if the members could not be fetched.
+    """
+    entry = _members_cache
+    if not no_cache and entry is not None:
+        age = time.monotonic() - entry.fetched_at
+        if age < CFG.members_ttl:
+            return entry
+        if age < CFG.members_ttl + CFG.members_stale_ttl:
+            # With GROUPME_MEMBERS_STALE_TTL set, serve the slightly stale list now and
+            # refresh it in the background, so this @all's post overlaps the members
+            # fetch instead of waiting on it.
+            if not _MEMBERS_CACHE_LOCK.locked():
+                _submit_background("members refresh", _refresh_members, False)
+            logger.info("Using stale group members (%d members, %.0fs old); refreshing in background.", len(entry.members), age)
+            return entry
+
+    return _refresh_members(no_cache)
+
+def _refresh_members(no_cache):
+    """
+    Refetches the group members unless another thread already has, and
+    replaces the cache entry if the list changed.
+
+    Args:
+        no_cache (bool): Refetch even if the cached entry is still fresh.
+
+    Returns:
+        MembersCacheEntry: The current entry, or None if the members could not be fetched.
+    """
+    global _members_cache
+    with _MEMBERS_CACHE_LOCK:
+        # Another thread may have refreshed the entry while we waited for the lock.
+        entry = _members_cache
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if not no_cache and age < CFG.members_ttl:
+                logger.info("Using cached group members (%d members, %.0fs old).", len(entry.members), age)
+                return entry
+
+        etag = entry.etag if entry is not None and not no_cache else None
+        members, etag = fetch_group_members(etag)
+        if members is None:
+            return None
+
+        if members is NOT_MODIFIED:
+            logger.info("Group members unchanged (304 Not Modified); reusing cached list.")
+            _members_cache = replace(entry, fetched_at=time.monotonic(), etag=etag)
+            return _members_cache
+
+        # GroupMe may not honor If-None-Match, so also compare the content and
+        # keep the existing list (and what was built from it) when nothing has changed.
+        fingerprint = hash(tuple(sorted(members)))
+        if entry is not None and fingerprint == entry.fingerprint:
+            logger.info("Group members unchanged since last fetch; reusing cached list.")
+            _members_cache = replace(entry, fetched_at=time.monotonic(), etag=etag)
+            return _members_cache
+
+        entry = MembersCacheEntry(
+            fetched_at=time.monotonic(),
+            members=members,
+            pages=_build_mention_pages(members),
+            etag=etag,
+            fingerprint=fingerprint,
+        )
+        _members_cache = entry
+        return entry
+
+def fetch_group_members(etag=None):
+    """
+    Fetches all members of the specified GroupMe group from the API.
 
     Requires GROUPME_ACCESS_TOKEN and GROUPME_GROUP_ID to be set.
 
+    Args:
+        etag (str, optional): ETag of the previously fetched list, sent as
+                              If-None-Match so an unchanged list isn't re-downloaded.
+
     Returns:
-        list: A list of member objects (dictionaries), or None if an error occurs.
+        tuple: (members, etag). members is a list of (tag, tag_u16_len, user_id)
+               tuples as described in get_group_members(), NOT_MODIFIED if the list
+               is unchanged since etag, or None if an error occurs. etag is the
+               response's ETag header, if any.
     """
-    if not ACCESS_TOKEN or not GROUP_ID:
-        logging.error("CRITICAL: GROUPME_ACCESS_TOKEN or GROUPME_GROUP_ID not configured. Cannot fetch members.")
-        return None
+    cfg = CFG
+    if not cfg.token or not cfg.group_id:
+        logger.error("CRITICAL: GROUPME_ACCESS_TOKEN or GROUPME_GROUP_ID not configured. Cannot fetch members.")
+        return None, None
 
-    url = f"{GROUPME_API_URL}/groups/{GROUP_ID}?token={ACCESS_TOKEN}"
-    logging.info(f"Attempting to fetch group members from GroupMe API for group ID: {GROUP_ID}")
+    url = f"{GROUPME_API_URL}/groups/{cfg.group_id}?token={cfg.token}"
+    logger.info("Attempting to fetch group members from GroupMe API for group ID: %s", cfg.group_id)
 
+    response = None
     try:
-        response = requests.get(url, timeout=15)
-        logging.info(f"Group members fetch response status: {response.status_code}")
+        headers = {'If-None-Match': etag} if etag else None
+        response = SESSION.get(url, headers=headers, timeout=API_TIMEOUT, stream=True)
+        logger.info("Group members fetch response status: %s", response.status_code)
+        if response.status_code == 304:
+            return NOT_MODIFIED, etag
         response.raise_for_status()
-        group_info = response.json()
-        members = group_info.get('response', {}).get('members', [])
-        logging.info(f"Successfully fetched {len(members)} members raw from API.")
-        if members:
-            logging.debug(f"First few members (debug, raw): {json.dumps(members[:2], indent=2)}")
-        return members
+        # The group object carries images, roles, message previews and more; keep
+        # only what the mention builder uses so the cached list stays small.
+        # Nicknames rarely change, so each member's tag and its UTF-16 length
+        # are built here, once per fetch, instead of on every @all.
+        if ijson is not None:
+            # Parse straight off the socket so the full body and the unused
+            # group fields are never materialized.
+            response.raw.decode_content = True # Let urllib3 undo any gzip encoding
+            raw_members = ijson.items(response.raw, 'response.members.item')
+        else:
+            group_info = response.json()
+            raw_members = group_info.get('response', {}).get('members', [])
+        # With ijson this is the only pass over the members: each one is turned
+        # into its cached tuple as it is parsed, and no member dicts are kept.
+        members = []
+        append = members.append
+        for m in raw_members:
+            tag = '@' + m['nickname']
+            append((tag, _u16len(tag), m['user_id']))
+        logger.info("Successfully fetched %d members from API.", len(members))
+        if members and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("First few members (debug): %s", _dumps(members[:2]))
+        return members, response.headers.get('ETag')
     except requests.exceptions.Timeout:
-        logging.error("Error fetching group members: Request timed out.")
-        return None
+        logger.error("Error fetching group members: Request timed out.")
+        return None, None
     except requests.exceptions.HTTPError as http_err:
-        logging.error(f"HTTP error fetching group members: {http_err}")
-        logging.error(f"Response content: {http_err.response.text}")
-        return None
+        logger.error("HTTP error fetching group members: %s", http_err)
+        # The response is streamed, so this is the first read of its body and
+        # can itself fail; that mustn't escape this except block.
+        try:
+            logger.error("Response content: %s", http_err.response.text[:500])
+        except (requests.exceptions.RequestException, Urllib3HTTPError) as e:
+            logger.error("Could not read the error response body: %s", e)
+        if http_err.response.status_code == 429:
+            _start_throttle(http_err.response)
+        return None, None
     except requests.exceptions.RequestException as e:
-        logging.error(f"Generic error fetching group members: {e}")
-        return None
-    except json.JSONDecodeError as e:
-        logging.error(f"Error decoding JSON response from GroupMe API (members fetch): {e}")
-        return None
+        logger.error("Generic error fetching group members: %s", e)
+        return None, None
+    except Urllib3HTTPError as e:
+        # ijson reads response.raw directly, so a timeout or dropped connection
+        # partway through the body comes straight from urllib3 without being
+        # wrapped in a requests exception.
+        logger.error("Error reading group members response: %s", e)
+        return None, None
+    except _MEMBERS_JSON_ERRORS as e:
+        logger.error("Error decoding JSON response from GroupMe API (members fetch): %s", e)
+        return None, None
+    finally:
+        if response is not None:
+            response.close()
 
 def send_bot_message(text, attachments=None):
     """
@@ -103,47 +529,258 @@ def send_bot_message(text, attachments=None):
 
     Args:
         text (str): The text content of the message.
-        attachments (list, optional): A list of GroupMe attachment objects.
+        attachments (list or bytes, optional): A list of GroupMe attachment
+                                               objects, or that list already
+                                               serialized to JSON.
 
     Returns:
         bool: True if the message was sent successfully (2xx status), False otherwise.
     """
-    if not BOT_ID:
-        logging.error("CRITICAL: GROUPME_BOT_ID not configured. Cannot send message.")
+    bot_id = CFG.bot_id
+    if not bot_id:
+        logger.error("CRITICAL: GROUPME_BOT_ID not configured. Cannot send message.")
         return False
 
     url = f"{GROUPME_API_URL}/bots/post"
     
-    payload = {'bot_id': BOT_ID, 'text': text}
+    # Assemble the JSON body from the cached bot_id prefix plus the orjson-encoded
+    # text and attachments, and send the bytes as-is rather than letting requests
+    # re-encode a payload dict with the stdlib json module.
+    body = _payload_prefix(bot_id) + orjson.dumps(text)
     if attachments:
-        payload['attachments'] = attachments
+        if not isinstance(attachments, bytes):
+            attachments = orjson.dumps(attachments)
+        body += b',"attachments":' + attachments
+    body += b'}'
 
-    logging.info(f"Attempting to send message. Bot ID: {BOT_ID}, URL: {url}")
-    logging.info(f"Payload being sent to GroupMe: {json.dumps(payload)}")
+    logger.info("Attempting to send message. Bot ID: %s, URL: %s", bot_id, url)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Payload being sent to GroupMe: %s", body.decode())
 
     try:
-        response = requests.post(url, json=payload, timeout=15)
-        logging.info(
-            f"GroupMe API response. Status: {response.status_code}, "
-            f"Headers: {response.headers}, Body: {response.text}"
-        )
+        response = SESSION.post(url, data=body, headers={'Content-Type': 'application/json'}, timeout=API_TIMEOUT)
 
         if 200 <= response.status_code < 300:
-            logging.info(f"Successfully sent message (received {response.status_code}). Text: '{text[:70]}...'")
+            logger.debug("GroupMe API response. Status: %s", response.status_code)
+            logger.info("Successfully sent message (received %s). Text: '%s...'", response.status_code, text[:70])
             return True
         else:
-            logging.error(
-                f"Error sending message. GroupMe API returned non-2xx status. "
-                f"Status: {response.status_code}, Response: {response.text}"
+            logger.error(
+                "Error sending message. GroupMe API returned non-2xx status. Status: %s, Response: %s",
+                response.status_code, response.text[:500]
             )
+            if response.status_code == 404:
+                # The cached member list may be stale; refetch it next time around.
+                cache_bust()
+            elif response.status_code == 429:
+                _start_throttle(response)
             return False
     except requests.exceptions.Timeout:
-        logging.error("Error sending message: Request timed out.")
+        logger.error("Error sending message: Request timed out.")
         return False
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error posting message via bot: {e}")
+        logger.error("Error posting message via bot: %s", e)
         return False
 
+# ==============================================================================
+#                           Mention Processing
+# ==============================================================================
+
+def _build_mention_pages(members):
+    """
+    Precomputes the sender-independent part of the @all mention messages.
+
+    Blacklisted members are dropped and the rest are split into pages that fit
+    GroupMe's per-message mention and length limits. Only the intro line depends
+    on who sent '@all', so each page stores its tags pre-joined along with
+    parallel arrays of tag lengths and of the step from each tag's start to the
+    next (its length plus the separating space). A request only has to run a
+    cumulative sum over the steps, starting at the intro length, to get every
+    offset. Lengths are in UTF-16 code units, as GroupMe expects. The user IDs
+    are also kept pre-serialized, since they go into every attachment for the
+    page unchanged. Runs once each time the fetched member list changes.
+
+    Args:
+        members (list): (tag, tag_u16_len, user_id) tuples as cached by get_members_entry().
+
+    Returns:
+        list: A list of (names_blob, steps, lengths, user_ids, user_ids_json)
+              tuples, one per page.
+    """
+    pages = []
+    page_tags = []
+    page_lengths = []
+    page_user_ids = []
+    page_chars = 0
+    cfg = CFG
+    # Bind everything the per-member loop reads to locals, so it doesn't repeat
+    # global and attribute lookups for every member.
+    blacklist = cfg.blacklist
+    mentions_per_message = cfg.mentions_per_message
+    max_chars = MAX_MENTION_TEXT_CHARS
+    page_count = 0
+    for tag, tag_len, user_id in members:
+        if user_id in blacklist:
+            logger.info("User %s (ID: %s) is blacklisted. Skipping.", tag[1:], user_id)
+            continue
+        tag_chars = len(tag)
+        if page_count and (page_count >= mentions_per_message or page_chars + tag_chars > max_chars):
+            pages.append((page_tags, page_lengths, page_user_ids))
+            page_tags, page_lengths, page_user_ids, page_chars, page_count = [], [], [], 0, 0
+        page_tags.append(tag)
+        page_lengths.append(tag_len)
+        page_user_ids.append(user_id)
+        page_chars += tag_chars + 1 # +1 for the space
+        page_count += 1
+    if page_user_ids:
+        pages.append((page_tags, page_lengths, page_user_ids))
+
+    # Each tag starts where the previous one ended plus one for the separating space.
+    return [
+        (
+            " ".join(page_tags),
+            array('i', [length + 1 for length in page_lengths[:-1]]),
+            array('i', page_lengths),
+            page_user_ids,
+            orjson.dumps(page_user_ids),
+        )
+        for page_tags, page_lengths, page_user_ids in pages
+    ]
+
+def _mention_attachments(entry, intro_len):
+    """
+    Returns the attachments of each of entry's pages, serialized to JSON, for an
+    intro line intro_len UTF-16 code units long.
+
+    The loci only depend on the intro's length, not on who sent '@all', so they
+    are built once per intro length and cache entry and then reused by
+    every later @all whose sender's name is as long. Only the loci are encoded
+    here; the rest of the mentions object is spliced in around them as bytes.
+
+    Args:
+        entry (MembersCacheEntry): The members cache entry the pages come from.
+        intro_len (int): Length of the intro line in UTF-16 code units.
+
+    Returns:
+        list: One JSON-encoded attachments list (bytes) per page, holding that
+              page's GroupMe mentions attachment, as accepted by send_bot_message().
+    """
+    attachments = entry.attachments_by_intro_len.get(intro_len)
+    if attachments is None:
+        attachments = [
+            b'[{"type":"mentions","user_ids":' + user_ids_json
+            + b',"loci":' + orjson.dumps(list(map(list, zip(accumulate(steps, initial=intro_len), lengths))))
+            + b'}]'
+            for _, steps, lengths, _, user_ids_json in entry.pages
+        ]
+        entry.attachments_by_intro_len[intro_len] = attachments
+    return attachments
+
+def _process_all_mention(sender_name, sender_id):
+    """
+    Fetches the group members and posts the @all mention message.
+
+    Runs on EXECUTOR so the webhook can return to GroupMe straight away.
+
+    Args:
+        sender_name (str): Nickname of the user who sent '@all'.
+        sender_id (str): GroupMe User ID of the user who sent '@all'.
+
+    Returns:
+        bool: True if the mention message was sent successfully, False otherwise.
+    """
+    try:
+        entry = get_members_entry()
+        if entry is None or not entry.members:
+            logger.error("Failed to get group members. Cannot proceed with @all.")
+            send_bot_message(f"Sorry @{sender_name}, I couldn't fetch group members for the @all command.")
+            return False
+
+        # Optional: Avoid self-mentioning the sender of '@all' if desired
+        # (filter sender_id out of the page's user_ids and loci below).
+
+        pages = entry.pages
+        mention_count = sum(len(page[3]) for page in pages)
+        logger.info("Total members fetched: %d. Members to mention after blacklist: %d.", len(entry.members), mention_count)
+
+        if not pages:
+            logger.info("No users to mention after filtering (empty group or all members blacklisted/filtered).")
+            send_bot_message(f"@{sender_name}, there was no one to mention with @all after applying filters.")
+            return True
+
+        mention_intro = f"Message from: @{sender_name} to all\n"
+        intro_len = _u16len(mention_intro)
+
+        messages = []
+        for page, attachments_json in zip(pages, _mention_attachments(entry, intro_len)):
+            final_message_text = mention_intro + page[0]
+            logger.info(
+                "Final mention text (first 150 chars): %s... (%d mentions)",
+                final_message_text[:150], len(page[3])
+            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Final mention attachments: %s", attachments_json.decode())
+            messages.append((final_message_text, attachments_json))
+
+        if len(messages) == 1:
+            results = [send_bot_message(*messages[0])]
+        else:
+            logger.info("Splitting @all into %d messages to stay within GroupMe's limits.", len(messages))
+            results = list(SEND_EXECUTOR.map(lambda message: send_bot_message(*message), messages))
+
+        if not all(results):
+            logger.error(
+                "send_bot_message returned False for %d of %d message(s). "
+                "The @all message might not have been fully delivered.",
+                results.count(False), len(results)
+            )
+            return False
+
+        logger.info("send_bot_message returned True. GroupMe API likely accepted the @all message.")
+        return True
+
+    except Exception as e:
+        # Nothing upstream inspects the future, so log here or the error is lost.
+        _log_exception("Unexpected error while processing @all", e)
+        return False
+
+# ==============================================================================
+#                           WSGI Middleware
+# ==============================================================================
+
+def _prefilter_webhook(wsgi_app):
+    """
+    Wraps the Flask WSGI app so webhook POSTs without '@all' are answered
+    before Flask builds a request context or dispatches the route.
+
+    Everything else, including GET / and any POST containing '@all', is passed
+    through to Flask unchanged.
+
+    Args:
+        wsgi_app (callable): The WSGI application to wrap (app.wsgi_app).
+
+    Returns:
+        callable: The wrapping WSGI application.
+    """
+    def middleware(environ, start_response):
+        if environ.get('REQUEST_METHOD') == 'POST' and environ.get('PATH_INFO', '') in ('', '/'):
+            try:
+                length = int(environ.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                length = 0
+            if length > 0:
+                body = environ['wsgi.input'].read(length)
+                if b'@all' not in body.lower():
+                    start_response('200 OK', [('Content-Length', '0')])
+                    return [b'']
+                # Flask still needs to read the body we just consumed.
+                environ['wsgi.input'] = io.BytesIO(body)
+                environ['CONTENT_LENGTH'] = str(len(body))
+        return wsgi_app(environ, start_response)
+    return middleware
+
+app.wsgi_app = _prefilter_webhook(app.wsgi_app)
+
 # ==============================================================================
 #                           Flask Routes
 # ==============================================================================
@@ -152,130 +789,141 @@ def send_bot_message(text, attachments=None):
 def webhook():
     """
     Handles incoming POST requests from GroupMe.
-    Checks for '@all' command and triggers mentions if found, respecting blacklist.
+    Checks for '@all' command and queues the mentions if found, respecting blacklist.
     """
     try:
+        # GroupMe posts every message in the group here and almost none contain
+        # @all, so check the raw body before paying for a full JSON parse.
+        # _prefilter_webhook() normally answers these before Flask is involved;
+        # this covers bodies it passes through (e.g. without a Content-Length).
+        raw = request.get_data(cache=True)
+        if not raw:
+            logger.warning("Webhook received empty data.")
+            return Response(status=204)
+        if b'@all' not in raw.lower():
+            return Response(status=200)
+        if time.monotonic() < _throttled_until:
+            logger.warning("Ignoring webhook while rate limited by GroupMe.")
+            return Response(status=200)
+
         data = request.get_json()
-        logging.info(f"Received webhook data: {json.dumps(data)}")
+        # Log a one-line summary; the full body is only serialized if DEBUG is on.
+        if isinstance(data, dict):
+            logger.info("Received webhook: keys=%s", list(data))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Received webhook data: %s", _dumps(data))
 
         if not data:
-            logging.warning("Webhook received empty data.")
+            logger.warning("Webhook received empty data.")
             return Response(status=204)
 
         if data.get('sender_type') == 'bot':
-            logging.info(f"Ignoring message from bot (sender_type: 'bot', name: {data.get('name')}).")
+            logger.info("Ignoring message from bot (sender_type: 'bot', name: %s).", data.get('name'))
             return Response(status=200)
 
         message_text = data.get('text', '').strip()
         sender_name = data.get('name', 'Someone')
         sender_id = data.get('sender_id')
 
-        if '@all' in message_text.lower():
-            logging.info(f"Detected '@all' command from {sender_name} (User ID: {sender_id}). Message: '{message_text}'")
+        if _ALL_RE.search(message_text):
+            logger.info("Detected '@all' command from %s (User ID: %s). Message: '%s'", sender_name, sender_id, message_text)
 
-            if not BOT_ID or not GROUP_ID or not ACCESS_TOKEN:
-                logging.error("Bot is not fully configured (BOT_ID, GROUP_ID, or ACCESS_TOKEN missing). Cannot process @all.")
-                if BOT_ID:
+            cfg = CFG
+            bot_id, group_id, token = cfg.bot_id, cfg.group_id, cfg.token
+            if not bot_id or not group_id or not token:
+                logger.error("Bot is not fully configured (BOT_ID, GROUP_ID, or ACCESS_TOKEN missing). Cannot process @all.")
+                if bot_id:
                     send_bot_message(f"Sorry @{sender_name}, I'm not fully configured to handle @all right now.")
                 return Response("Bot configuration incomplete", status=500)
 
-            all_members = get_group_members()
-            if not all_members:
-                logging.error("Failed to get group members. Cannot proceed with @all.")
-                send_bot_message(f"Sorry @{sender_name}, I couldn't fetch group members for the @all command.")
-                return Response("Failed to fetch group members", status=500)
-
-            # Filter members based on the blacklist
-            members_to_mention = []
-            for member in all_members:
-                if member.get('user_id') in BLACKLISTED_USER_IDS:
-                    logging.info(f"User {member.get('nickname')} (ID: {member.get('user_id')}) is blacklisted. Skipping.")
-                    continue
-                # Optional: Avoid self-mentioning the sender of '@all' if desired
-                # if member.get('user_id') == sender_id:
-                #    logging.info(f"Skipping sender {sender_name} from @all mention as per configuration (optional).")
-                #    continue
-                members_to_mention.append(member)
-            
-            logging.info(f"Total members fetched: {len(all_members)}. Members to mention after blacklist: {len(members_to_mention)}.")
-
-            if not members_to_mention:
-                logging.info("No users to mention after filtering (empty group or all members blacklisted/filtered).")
-                send_bot_message(f"@{sender_name}, there was no one to mention with @all after applying filters.")
+            if _already_queued(data.get('id')):
+                logger.info("Ignoring duplicate delivery of message %s.", data.get('id'))
                 return Response(status=200)
 
-            mention_intro = f"Message from: @{sender_name} to all\n"
-            
-            # Refined Loci Calculation:
-            running_offset = len(mention_intro) 
-            
-            final_mention_text_parts = [mention_intro.strip()] # Start with the intro, no leading/trailing whitespace for this part
-            processed_user_ids_for_attachment = []
-            loci_data_for_attachment = []
-
-            for member in members_to_mention:
-                nickname_mention_str = f"@{member['nickname']}"
-                final_mention_text_parts.append(nickname_mention_str)
-
-                loci_data_for_attachment.append([running_offset, len(nickname_mention_str)])
-                processed_user_ids_for_attachment.append(member['user_id'])
-
-                running_offset += len(nickname_mention_str) + 1 # +1 for the space
-            
-            final_message_text = " ".join(final_mention_text_parts) # Join intro and all @nickname parts
-
-            mention_attachment = {
-                "type": "mentions",
-                "user_ids": processed_user_ids_for_attachment,
-                "loci": loci_data_for_attachment
-            }
-
-            logging.info(f"Final mention text (first 150 chars): {final_message_text[:150]}...")
-            logging.info(f"Final mention attachment: {json.dumps(mention_attachment)}")
-
-            if not send_bot_message(final_message_text, [mention_attachment]):
-                logging.error("send_bot_message returned False. The @all message might not have been delivered.")
-                return Response("Failed to send mention message via bot", status=500)
-            else:
-                logging.info("send_bot_message returned True. GroupMe API likely accepted the @all message.")
+            # The fetch and post can take a couple of round trips; answer GroupMe
+            # now so a slow reply doesn't cause it to retry and double-post.
+            EXECUTOR.submit(_process_all_mention, sender_name, sender_id)
+            logger.info("Queued @all mention for background processing.")
 
         else:
-            logging.info(f"No '@all' command detected in message: '{message_text}'")
+            logger.info("No '@all' command detected in message: '%s'", message_text)
 
     except Exception as e:
-        logging.error(f"An unexpected error occurred in webhook: {e}")
-        logging.error(traceback.format_exc())
+        _log_exception("Webhook processing failed", e)
         return Response("Internal server error during webhook processing", status=500)
 
     return Response(status=200)
 
 
+@app.route('/invalidate', methods=['POST'])
+def invalidate():
+    """
+    Drops the cached group members (and the mention pages built from them), e.g.
+    after someone joins the group, so the next @all refetches the members from
+    the API instead of waiting for the cache to expire.
+
+    The caller must send GROUPME_INVALIDATE_TOKEN in an X-Invalidate-Token
+    header; the route is disabled when it isn't set. It is deliberately not
+    accepted as a query parameter, which would end up in access and proxy logs.
+
+    This only clears the cache of the gunicorn worker that receives the
+    request; other workers keep their list until it expires
+    (GROUPME_MEMBERS_TTL). Configuration changes such as the blacklist or the
+    access token are not picked up here: App Service restarts the app when its
+    settings change.
+    """
+    expected = CFG.invalidate_token
+    if not expected:
+        return Response(status=404)
+    supplied = request.headers.get('X-Invalidate-Token', '')
+    if not hmac.compare_digest(supplied.encode(), expected.encode()):
+        logger.warning("Rejected POST /invalidate with a missing or wrong token.")
+        return Response(status=403)
+    cache_bust()
+    logger.info("Cache invalidation requested via POST /invalidate.")
+    return Response(status=204)
+
+
 @app.route('/', methods=['GET'])
 def health_check():
-    logging.info("Health check endpoint '/' accessed via GET.")
+    logger.info("Health check endpoint '/' accessed via GET.")
     status_message = "GroupMe @all Bot is running."
     issues = []
-    if not BOT_ID: issues.append("GROUPME_BOT_ID missing")
-    if not GROUP_ID: issues.append("GROUPME_GROUP_ID missing")
-    if not ACCESS_TOKEN: issues.append("GROUPME_ACCESS_TOKEN missing")
+    cfg = CFG
+    if not cfg.bot_id: issues.append("GROUPME_BOT_ID missing")
+    if not cfg.group_id: issues.append("GROUPME_GROUP_ID missing")
+    if not cfg.token: issues.append("GROUPME_ACCESS_TOKEN missing")
 
     if issues:
         status_message += " WARNING: Configuration issues detected: " + ", ".join(issues)
     else:
         status_message += " All essential configurations seem present."
     
-    if BLACKLISTED_USER_IDS_STR:
-        status_message += f" Blacklist is configured with {len(BLACKLISTED_USER_IDS)} ID(s)."
+    if cfg.blacklist_str:
+        status_message += f" Blacklist is configured with {len(cfg.blacklist)} ID(s)."
     else:
         status_message += " No blacklist configured."
 
     return status_message, 200
 
+# ==============================================================================
+#                           Startup Warm-up
+# ==============================================================================
+# Fetch the members once in the background as soon as the app loads, so the
+# first @all finds a warm members cache and an open, kept-alive connection to
+# the GroupMe API instead of paying for the fetch and TLS handshake itself.
+if CFG.warm_up and CFG.token and CFG.group_id:
+    _submit_background("members warm-up", get_group_members)
+
 # ==============================================================================
 #                           Main Execution Block
 # ==============================================================================
+# In production, run under gunicorn with the settings in gunicorn.conf.py
+# (gevent workers; Azure App Service startup command):
+#   gunicorn -c gunicorn.conf.py app:app
+# The development server below is only meant for running the bot locally.
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8000))
-    logging.info(f"Starting Flask development server on host 0.0.0.0 port {port}")
+    logger.info("Starting Flask development server on host 0.0.0.0 port %s", port)
     app.run(host='0.0.0.0', port=port, debug=False)
 
@@ -0,0 +1,17 @@
+# ==============================================================================
+#                           Gunicorn Configuration
+# ==============================================================================
+# Production server settings for the bot (Azure App Service startup command):
+#   gunicorn -c gunicorn.conf.py app:app
+# gevent workers let each process hold many webhooks that are waiting on the
+# GroupMe API instead of serving them one at a time like the Flask dev server.
+import os
+
+# App Service tells the container which port to listen on.
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+
+workers = 2
+worker_class = 'gevent'
+worker_connections = 100 # Concurrent requests per worker
+keepalive = 30           # Seconds to hold idle connections open for reuse
+timeout = 30             # Restart a worker that stops responding for this long
@@ -0,0 +1,140 @@
+"""
+Tests for the @all mention builder: paging, the blacklist and the mention loci.
+
+Run from the repository root with:
+    python -m unittest discover -s tests
+"""
+import os
+import unittest
+from dataclasses import replace
+
+import orjson
+
+# Keep importing the app from fetching the members over the network.
+os.environ.setdefault('GROUPME_WARM_UP', '0')
+
+import app
+
+
+def make_members(nicknames):
+    """
+    Builds (tag, tag_u16_len, user_id) tuples the way fetch_group_members()
+    does, with user IDs 'u0', 'u1', ...
+    """
+    return [('@' + nick, app._u16len('@' + nick), f'u{i}') for i, nick in enumerate(nicknames)]
+
+
+def make_entry(members):
+    """
+    Wraps members and the pages built from them in a MembersCacheEntry.
+    """
+    return app.MembersCacheEntry(
+        fetched_at=0.0,
+        members=members,
+        pages=app._build_mention_pages(members),
+        etag=None,
+        fingerprint=0,
+    )
+
+
+class MentionPagesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.original_cfg = app.CFG
+        app.CFG = replace(app.CFG, blacklist=frozenset(), mentions_per_message=50)
+
+    def tearDown(self):
+        app.CFG = self.original_cfg
+
+    def build_messages(self, members, sender_name):
+        """
+        Returns (text, attachment) for each message an @all from sender_name
+        would post, exactly as _process_all_mention() assembles them.
+        """
+        entry = make_entry(members)
+        intro = f"Message from: @{sender_name} to all\n"
+        attachments = app._mention_attachments(entry, app._u16len(intro))
+        self.assertEqual(len(attachments), len(entry.pages))
+        messages = []
+        for page, attachments_json in zip(entry.pages, attachments):
+            attachment_list = orjson.loads(attachments_json)
+            self.assertEqual(len(attachment_list), 1)
+            messages.append((intro + page[0], attachment_list[0]))
+        return messages
+
+    def assert_loci_match(self, text, attachment, user_tags):
+        """
+        Checks that every locus, read as UTF-16 code units, covers exactly the
+        tag of the user it mentions.
+        """
+        self.assertEqual(attachment['type'], 'mentions')
+        self.assertEqual(len(attachment['loci']), len(attachment['user_ids']))
+        encoded = text.encode('utf-16-le')
+        for (offset, length), user_id in zip(attachment['loci'], attachment['user_ids']):
+            mentioned = encoded[offset * 2:(offset + length) * 2].decode('utf-16-le')
+            self.assertEqual(mentioned, user_tags[user_id])
+
+    def test_loci_cover_each_tag(self):
+        members = make_members(['Ann', 'Bob', 'Cleo'])
+        tags = {user_id: tag for tag, _, user_id in members}
+        [(text, attachment)] = self.build_messages(members, 'Dana')
+        self.assertEqual(text, "Message from: @Dana to all\n@Ann @Bob @Cleo")
+        self.assertEqual(attachment['user_ids'], ['u0', 'u1', 'u2'])
+        self.assert_loci_match(text, attachment, tags)
+
+    def test_loci_count_utf16_code_units(self):
+        # Emoji outside the BMP are two UTF-16 code units (one Python character).
+        members = make_members(['Zoë', '😀Smile', 'A👍🏽B', 'plain', '🎉🎉'])
+        tags = {user_id: tag for tag, _, user_id in members}
+        [(text, attachment)] = self.build_messages(members, 'Sender 🚀')
+        self.assert_loci_match(text, attachment, tags)
+        self.assertEqual(attachment['loci'][2][1], 7) # '@A👍🏽B' is 5 characters
+
+    def test_blacklisted_members_are_skipped(self):
+        os.environ['GROUPME_BLACKLIST_USER_IDS'] = ' u1, u3 '
+        try:
+            app.CFG = replace(app.load_config(), mentions_per_message=50)
+        finally:
+            del os.environ['GROUPME_BLACKLIST_USER_IDS']
+        members = make_members(['Ann', 'Bob', 'Cleo', 'Dan', 'Eve'])
+        tags = {user_id: tag for tag, _, user_id in members}
+        [(text, attachment)] = self.build_messages(members, 'Ann')
+        self.assertEqual(attachment['user_ids'], ['u0', 'u2', 'u4'])
+        self.assertNotIn('@Bob', text)
+        self.assert_loci_match(text, attachment, tags)
+
+    def test_pages_split_at_mention_limit(self):
+        members = make_members([f'Member{i}' for i in range(120)])
+        tags = {user_id: tag for tag, _, user_id in members}
+        messages = self.build_messages(members, 'Ann')
+        self.assertEqual([len(a['user_ids']) for _, a in messages], [50, 50, 20])
+        self.assertEqual(
+            [user_id for _, a in messages for user_id in a['user_ids']],
+            [user_id for _, _, user_id in members]
+        )
+        for text, attachment in messages:
+            self.assert_loci_match(text, attachment, tags)
+
+    def test_pages_split_at_character_limit(self):
+        members = make_members([f'{i:02d}' + '😀x' * 40 for i in range(30)])
+        tags = {user_id: tag for tag, _, user_id in members}
+        entry = make_entry(members)
+        self.assertGreater(len(entry.pages), 1)
+        for names_blob, _, _, _, _ in entry.pages:
+            self.assertLessEqual(len(names_blob), app.MAX_MENTION_TEXT_CHARS)
+        messages = self.build_messages(members, 'Ann')
+        self.assertEqual(sum(len(a['user_ids']) for _, a in messages), len(members))
+        for text, attachment in messages:
+            self.assert_loci_match(text, attachment, tags)
+
+    def test_attachments_reused_for_same_intro_length(self):
+        entry = make_entry(make_members(['Ann', 'Bob']))
+        first = app._mention_attachments(entry, 30)
+        self.assertIs(app._mention_attachments(entry, 30), first)
+        self.assertIsNot(app._mention_attachments(entry, 31), first)
+        # Entries derived by replace() on a revalidation share the cache.
+        self.assertIs(app._mention_attachments(replace(entry, fetched_at=1.0), 30), first)
+
+
+if __name__ == '__main__':
+    unittest.main()